@@ -1,5 +1,8 @@
 from .pow_solve import POWSolver
 import requests
+import threading
+import queue
+import time
 import json
 
 COMPLETION_PATH = "/api/v0/chat/completion"
@@ -7,75 +10,78 @@ POW_REQUEST = json.dumps({"target_path": COMPLETION_PATH})
 
 
 class DeepSeekAPI:
-    def __init__(self, token: str, pow_solver: POWSolver):
+    def __init__(self, token: str, pow_solver: POWSolver, hedge_delay: float = None, hedge_max_rate: float = 0.05, timeout: float = None):
+        """
+        timeout is passed to every HTTP request, so a stalled connection or stream
+        raises requests.Timeout after that many seconds without data.
+        If hedge_delay is set, new conversations (no parent_message_id) are hedged:
+        when no output arrives within hedge_delay seconds, a duplicate request is sent
+        in a fresh chat and whichever produces output first is used.
+        Duplicates are capped at hedge_max_rate of new conversations (follow-up
+        messages are neither hedged nor counted), with a burst of one so the
+        first slow request can be hedged. hedge_stats counts the new conversations
+        ('requests'), the duplicates sent ('fired') and those that won ('won').
+        """
         self.session = requests.Session()
         self.session.headers["authorization"] = f"Bearer {token}"
         self.session.headers["Content-Type"] = "application/json"
         self.pow_solver = pow_solver
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.hedge_max_rate = hedge_max_rate
+        self.hedge_stats = {"requests": 0, "fired": 0, "won": 0}
+        self._pow_lock = threading.Lock()
+        self._hedge_lock = threading.Lock()
 
     def create_chat(self):
         r = self.session.post(
-            "https://chat.deepseek.com/api/v0/chat_session/create", "{}")
+            "https://chat.deepseek.com/api/v0/chat_session/create", "{}", timeout=self.timeout)
         chat = r.json()["data"]["biz_data"]
         return chat
 
     def get_chat_info(self, chat_id: str):
-        r = self.session.get(f"https://chat.deepseek.com/api/v0/chat/history_messages?chat_session_id={chat_id}")
+        r = self.session.get(f"https://chat.deepseek.com/api/v0/chat/history_messages?chat_session_id={chat_id}", timeout=self.timeout)
         data = r.json()
         if data.get("code") != 0:
             raise Exception(f"Failed to get chat info: {data.get('msg')}")
         return data["data"]["biz_data"]["chat_session"]
 
-    def _set_pow_header(self):
+    def _pow_headers(self) -> dict:
         r = self.session.post(
-            "https://chat.deepseek.com/api/v0/chat/create_pow_challenge", POW_REQUEST)
+            "https://chat.deepseek.com/api/v0/chat/create_pow_challenge", POW_REQUEST, timeout=self.timeout)
         challenge = r.json()["data"]["biz_data"]["challenge"]
-        self.session.headers["x-ds-pow-response"] = self.pow_solver.solve_challenge(
-            challenge)
-
-    def complete(self, chat_id: str, prompt: str, parent_message_id: int = None, search=False, thinking=False) -> str:
-        self._set_pow_header()
-        request = {
-            "chat_session_id": chat_id,
-            "prompt": prompt,
-            "parent_message_id": parent_message_id,
-            "ref_file_ids": [],
-            "search_enabled": search,
-            "thinking_enabled": thinking
-        }
-        r = self.session.post(
-            f"https://chat.deepseek.com{COMPLETION_PATH}", json.dumps(request), stream=True)
-        message = {}
-        current_property = None
-        for line in r.iter_lines():
-            if line == b"event: finish":
-                break
-            if not line.startswith(b"data: "):
-                continue
-            data: dict = json.loads(line[6:])
-            v = data.get("v")
-            if v is None:
-                continue
-            if isinstance(v, dict):  # received the initial response
-                message = v
-                continue
+        with self._pow_lock:  # the solver is not thread safe
+            return {"x-ds-pow-response": self.pow_solver.solve_challenge(challenge)}
 
-            path: str = data.get("p")
-            if path is None:  # append to current property
-                data["p"] = current_property
-                data["o"] = "APPEND"
-            self._handle_property_update(message, data)
-            current_property = data["p"]
-        try:
-            return message["response"]
-        except KeyError:
-            raise RuntimeError(f"No 'response' key in message: {message}")
+    def complete(self, chat_id: str, prompt: str, parent_message_id: int = None, search=False, thinking=False) -> dict:
+        """Runs a completion and returns the final result.
+        See complete_stream for the structure of the returned dict.
+        """
+        result = None
+        for chunk in self.complete_stream(chat_id, prompt, parent_message_id, search, thinking):
+            if chunk["type"] == "message":
+                result = chunk["content"]
+        return result
 
     def complete_stream(self, chat_id: str, prompt: str, parent_message_id: int = None, search=False, thinking=False):
         """Generator that yields chunks of the streaming response.
         Each chunk is a dict with 'type' ('content' or 'thinking') and 'content' (the incremental string).
+        The last chunk has type 'message' and its 'content' is a dict with 'chat_session_id',
+        'request_message_id', 'response_message_id' (pass it as parent_message_id to continue
+        the chat), 'status', 'token_usage', the full 'response' and any other metadata
+        from the initial message.
+        When hedging is enabled the result may come from a fresh chat, so continue
+        the conversation in the returned 'chat_session_id'.
         """
-        self._set_pow_header()
+        if self.hedge_delay is None or parent_message_id is not None:
+            r = self._post_completion(
+                chat_id, prompt, parent_message_id, search, thinking)
+            yield from self._iter_completion(r, chat_id)
+        else:
+            yield from self._hedged_stream(chat_id, prompt, search, thinking)
+
+    def _post_completion(self, chat_id: str, prompt: str, parent_message_id: int, search: bool, thinking: bool):
+        headers = self._pow_headers()
         request = {
             "chat_session_id": chat_id,
             "prompt": prompt,
@@ -84,9 +90,12 @@ class DeepSeekAPI:
             "search_enabled": search,
             "thinking_enabled": thinking
         }
-        r = self.session.post(
-            f"https://chat.deepseek.com{COMPLETION_PATH}", json.dumps(request), stream=True)
+        return self.session.post(
+            f"https://chat.deepseek.com{COMPLETION_PATH}", json.dumps(request), headers=headers, stream=True, timeout=self.timeout)
+
+    def _iter_completion(self, r: requests.Response, chat_id: str):
         message = {}
+        message_ids = {}
         current_property = None
         for line in r.iter_lines():
             if line == b"event: finish":
@@ -96,6 +105,8 @@ class DeepSeekAPI:
             data: dict = json.loads(line[6:])
             v = data.get("v")
             if v is None:
+                if "response_message_id" in data:  # the 'ready' event
+                    message_ids = data
                 continue
             if isinstance(v, dict):  # initial full message
                 message = v
@@ -119,10 +130,78 @@ class DeepSeekAPI:
                 yield {"type": "content", "content": v}
             elif path == "response/thinking_content":
                 yield {"type": "thinking", "content": v}
+        yield {"type": "message", "content": self._build_result(chat_id, message, message_ids)}
+
+    def _hedged_stream(self, chat_id: str, prompt: str, search: bool, thinking: bool):
+        events = queue.Queue()
+        primary = _HedgeAttempt(self, events, chat_id, prompt, search, thinking)
+        attempts = [primary]
+        winner = None
+        hedge_pending = True
+        deadline = time.monotonic() + self.hedge_delay
+        with self._hedge_lock:
+            self.hedge_stats["requests"] += 1
         try:
-            yield {"type": "message", "content": message["response"]}
+            while True:
+                timeout = None
+                if winner is None and hedge_pending:
+                    timeout = max(0, deadline - time.monotonic())
+                try:
+                    attempt, chunk, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_pending = False
+                    if self._take_hedge():
+                        attempts.append(_HedgeAttempt(
+                            self, events, None, prompt, search, thinking))
+                    continue
+                if chunk is None:
+                    attempt.finished = True
+                if winner is None:
+                    if chunk is None and not all(a.finished for a in attempts):
+                        continue  # failed without output, wait for the other attempt
+                    winner = attempt
+                    for other in attempts:
+                        if other is not winner:
+                            other.cancel()
+                    if winner is not primary and chunk is not None:
+                        with self._hedge_lock:
+                            self.hedge_stats["won"] += 1
+                if attempt is not winner:
+                    continue
+                if chunk is not None:
+                    yield chunk
+                elif error is not None:
+                    raise error
+                else:
+                    return
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def _take_hedge(self) -> bool:
+        with self._hedge_lock:
+            stats = self.hedge_stats
+            # allow one hedge up front so short-lived processes can hedge too
+            if stats["fired"] >= max(1, self.hedge_max_rate * stats["requests"]):
+                return False
+            stats["fired"] += 1
+            return True
+
+    def _build_result(self, chat_id: str, message: dict, message_ids: dict) -> dict:
+        try:
+            response = message["response"]
         except KeyError:
             raise RuntimeError(f"No 'response' key in message: {message}")
+        result = {key: value for key, value in message.items() if key != "response"}
+        result.update({
+            "chat_session_id": chat_id,
+            "request_message_id": message_ids.get("request_message_id", response.get("parent_id")),
+            "response_message_id": message_ids.get("response_message_id", response.get("message_id")),
+            "status": response.get("status"),
+            "token_usage": response.get("accumulated_token_usage"),
+            "response": response
+        })
+        return result
 
     def _handle_property_update(self, obj: dict, update: dict):
         keys = update["p"].split("/")
@@ -140,6 +219,54 @@ class DeepSeekAPI:
                 if last_key not in data:
                     data[last_key] = ""
                 data[last_key] += update["v"]
+            case "BATCH":
+                # a list of updates relative to the given path
+                for item in update["v"]:
+                    self._handle_property_update(
+                        obj, {**item, "p": f"{update['p']}/{item['p']}"})
             case _:
                 return False
-        return True
\ No newline at end of file
+        return True
+
+
+class _HedgeAttempt:
+    """A completion running in a background thread, reporting to a queue.
+    Puts (attempt, chunk, None) for each chunk and (attempt, None, error) when done.
+    A chat_id of None creates a fresh chat first.
+    """
+
+    def __init__(self, api: DeepSeekAPI, events: queue.Queue, chat_id: str, prompt: str, search: bool, thinking: bool):
+        self.api = api
+        self.events = events
+        self.finished = False
+        self.response = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(chat_id, prompt, search, thinking), daemon=True)
+        self._thread.start()
+
+    def _run(self, chat_id: str, prompt: str, search: bool, thinking: bool):
+        error = None
+        try:
+            if chat_id is None:
+                chat_id = self.api.create_chat()["id"]
+            self.response = self.api._post_completion(
+                chat_id, prompt, None, search, thinking)
+            if self._cancelled.is_set():
+                self.response.close()
+                return
+            for chunk in self.api._iter_completion(self.response, chat_id):
+                if self._cancelled.is_set():
+                    return
+                self.events.put((self, chunk, None))
+        except Exception as e:
+            error = e
+        finally:
+            if not self._cancelled.is_set():
+                self.events.put((self, None, error))
+
+    def cancel(self):
+        """Stops the attempt and releases its connection."""
+        self._cancelled.set()
+        if self.response is not None:
+            self.response.close()
@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .api import DeepSeekAPI
+from .pow_solve import POWSolver
+from .pow_daemon import POWSolverClient
+
+
+class _Checkpoint:
+    """
+    Tracks which input lines are finished. Every line before 'watermark' is done,
+    'done' holds finished lines past it, and 'output_offset' is the size of the
+    output file when the checkpoint was saved. Lines in 'retry' are run again
+    even though they finished.
+    """
+
+    def __init__(self, watermark: int = 0, done=(), output_offset: int = 0):
+        self.watermark = watermark
+        self.done = set(done)
+        self.output_offset = output_offset
+        self.retry = set()
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.isfile(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["watermark"], data["done"], data["output_offset"])
+
+    def save(self, path: str, output_offset: int):
+        self.output_offset = output_offset
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "watermark": self.watermark,
+                "done": sorted(self.done),
+                "output_offset": output_offset
+            }, f)
+        os.replace(tmp_path, path)
+
+    def is_done(self, index: int) -> bool:
+        return index not in self.retry and (index < self.watermark or index in self.done)
+
+    def mark_done(self, index: int):
+        self.retry.discard(index)
+        if index < self.watermark:
+            return
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def recover(self, output_path: str):
+        """Marks results written after the last save as done and drops a partially written last line."""
+        if not os.path.isfile(output_path):
+            if self.watermark or self.done or self.output_offset:
+                raise RuntimeError(
+                    f"{output_path} is missing but the checkpoint records finished lines; "
+                    "restore it or remove the checkpoint to start over")
+            return
+        size = os.path.getsize(output_path)
+        if size < self.output_offset:
+            raise RuntimeError(
+                f"{output_path} is shorter than the checkpoint expects ({size} < {self.output_offset} bytes); "
+                "restore it or remove the checkpoint to start over")
+        with open(output_path, "r+b") as f:
+            f.seek(self.output_offset)
+            offset = self.output_offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.mark_done(json.loads(line)["index"])
+                offset += len(line)
+            f.truncate(offset)
+
+    def retry_errors(self, output_path: str):
+        """Marks lines whose latest result in the output is an error to be run again."""
+        if not os.path.isfile(output_path):
+            return
+        with open(output_path, "rb") as f:
+            for line in f:
+                result = json.loads(line)
+                if "error" in result:
+                    self.retry.add(result["index"])
+                else:
+                    self.retry.discard(result["index"])
+
+
+class _Stats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.done = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.solves = 0
+        self.solve_total = 0.0
+        self.solve_max = 0.0
+        self.lock = threading.Lock()
+
+    def add_solve(self, elapsed: float):
+        with self.lock:
+            self.solves += 1
+            self.solve_total += elapsed
+            self.solve_max = max(self.solve_max, elapsed)
+
+    def add_result(self, result: dict):
+        with self.lock:
+            self.done += 1
+            self.latency_total += result["latency"]
+            if "error" in result:
+                self.errors += 1
+
+    def report(self) -> str:
+        with self.lock:
+            elapsed = time.monotonic() - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            latency = self.latency_total / self.done if self.done else 0.0
+            solve = self.solve_total / self.solves if self.solves else 0.0
+            return (f"{self.done} done ({rate:.2f}/s), {self.errors} errors, "
+                    f"latency {latency:.2f}s avg, "
+                    f"solve {solve:.2f}s avg / {self.solve_max:.2f}s max")
+
+
+class _TimedSolver:
+    """Wraps a solver to record how long each solve takes."""
+
+    def __init__(self, solver, stats: _Stats):
+        self.solver = solver
+        self.stats = stats
+        self.solve_time = 0.0
+
+    def solve_challenge(self, challenge: dict):
+        start = time.monotonic()
+        try:
+            return self.solver.solve_challenge(challenge)
+        finally:
+            elapsed = time.monotonic() - start
+            self.solve_time += elapsed
+            self.stats.add_solve(elapsed)
+
+
+def _read_records(input_path: str, checkpoint: _Checkpoint):
+    with open(input_path) as f:
+        for index, line in enumerate(f):
+            if not checkpoint.is_done(index):
+                yield index, line
+
+
+def run_batch(input_path: str, output_path: str, make_api, concurrency: int = 4,
+              checkpoint_path: str = None, search=False, thinking=False,
+              retry_errors=False, timeout: float = None,
+              checkpoint_interval: float = 5.0, progress_interval: float = 10.0,
+              progress_file=sys.stderr):
+    """
+    Runs every prompt in a JSONL file and appends the results to output_path in
+    completion order. Input records are objects with a 'prompt' and optionally
+    'id', 'search' and 'thinking'. Progress is checkpointed, so running the same
+    command again after an interruption skips records that already finished.
+    Records that fail are written with an 'error' and count as finished;
+    with retry_errors, records whose latest result is an error are run again.
+    A record taking longer than timeout seconds fails with a TimeoutError;
+    the timeout is also set on each API so stalled requests are abandoned.
+    make_api is called once per worker thread and must return a DeepSeekAPI.
+    Returns the run's statistics.
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    checkpoint = _Checkpoint.load(checkpoint_path)
+    checkpoint.recover(output_path)
+    if retry_errors:
+        checkpoint.retry_errors(output_path)
+    stats = _Stats()
+    local = threading.local()
+    write_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    last_save = time.monotonic()
+    finished = threading.Event()
+    failures = []
+
+    def process(index: int, line: str) -> dict:
+        if not hasattr(local, "api"):
+            local.api = make_api()
+            if timeout is not None:
+                local.api.timeout = timeout
+            local.solver = local.api.pow_solver = _TimedSolver(
+                local.api.pow_solver, stats)
+        local.solver.solve_time = 0.0
+        start = time.monotonic()
+        result = {"index": index}
+        try:
+            record = json.loads(line)
+            result["id"] = record.get("id", index)
+            chat = local.api.create_chat()
+            message = None
+            for chunk in local.api.complete_stream(
+                    chat["id"], record["prompt"],
+                    search=record.get("search", search),
+                    thinking=record.get("thinking", thinking)):
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise TimeoutError(f"Record took longer than {timeout}s")
+                if chunk["type"] == "message":
+                    message = chunk["content"]
+            response = message["response"]
+            result.update({
+                "chat_session_id": message["chat_session_id"],
+                "request_message_id": message["request_message_id"],
+                "response_message_id": message["response_message_id"],
+                "status": message["status"],
+                "token_usage": message["token_usage"],
+                "content": response.get("content")
+            })
+            if response.get("thinking_content"):
+                result["thinking_content"] = response["thinking_content"]
+        except Exception as e:
+            result["error"] = repr(e)
+        result["latency"] = time.monotonic() - start
+        result["solve_time"] = local.solver.solve_time
+        return result
+
+    def write(output, future):
+        nonlocal last_save
+        try:
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                failures.append(future.exception())
+                return
+            result = future.result()
+            with write_lock:
+                output.write(
+                    (json.dumps(result, ensure_ascii=False) + "\n").encode())
+                checkpoint.mark_done(result["index"])
+                if time.monotonic() - last_save >= checkpoint_interval:
+                    output.flush()
+                    checkpoint.save(checkpoint_path, output.tell())
+                    last_save = time.monotonic()
+            stats.add_result(result)
+        finally:
+            slots.release()
+
+    def report_progress():
+        while not finished.wait(progress_interval):
+            print(stats.report(), file=progress_file, flush=True)
+
+    if progress_file is not None:
+        threading.Thread(target=report_progress, daemon=True).start()
+    with open(output_path, "ab") as output:
+        try:
+            with ThreadPoolExecutor(concurrency) as pool:
+                try:
+                    for index, line in _read_records(input_path, checkpoint):
+                        if not line.strip():
+                            with write_lock:
+                                checkpoint.mark_done(index)
+                            continue
+                        slots.acquire()
+                        if failures:
+                            slots.release()
+                            break
+                        future = pool.submit(process, index, line)
+                        future.add_done_callback(
+                            lambda future: write(output, future))
+                except BaseException:
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        finally:
+            finished.set()
+            with write_lock:
+                output.flush()
+                checkpoint.save(checkpoint_path, output.tell())
+    if failures:
+        raise failures[0]
+    if progress_file is not None:
+        print(stats.report(), file=progress_file, flush=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run prompts from a JSONL file through DeepSeek, resuming interrupted runs.")
+    parser.add_argument("input", help="JSONL file of {\"prompt\", \"id\"?, \"search\"?, \"thinking\"?} records")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--token", default=os.environ.get("DEEPSEEK_TOKEN"),
+                        help="API token (default: $DEEPSEEK_TOKEN)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="number of prompts running at once (default: %(default)s)")
+    parser.add_argument("--checkpoint",
+                        help="checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--search", action="store_true",
+                        help="enable search for records that don't set it")
+    parser.add_argument("--thinking", action="store_true",
+                        help="enable thinking for records that don't set it")
+    parser.add_argument("--wasm-path", help="path to the solver wasm module")
+    parser.add_argument("--pow-socket",
+                        help="solve PoW through the deepseek-pow-daemon listening on this socket")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="seconds a record may take before it fails (default: %(default)s)")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="run again the records whose last result was an error")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="seconds between progress reports (default: %(default)s)")
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("a token is required (--token or $DEEPSEEK_TOKEN)")
+
+    def make_api():
+        if args.pow_socket:
+            solver = POWSolverClient(args.pow_socket, wasm_path=args.wasm_path)
+        else:
+            solver = POWSolver(args.wasm_path)
+        return DeepSeekAPI(args.token, solver)
+
+    try:
+        run_batch(args.input, args.output, make_api, args.concurrency,
+                  args.checkpoint, args.search, args.thinking, args.retry_errors,
+                  args.timeout, progress_interval=args.progress_interval)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import socket
+import stat
+import struct
+import threading
+import platformdirs
+from .pow_solve import POWSolver
+from .wasm_download import get_wasm_path
+
+HEADER = struct.Struct(">I")
+
+
+def get_socket_path():
+    """
+    Returns the default path of the PoW daemon's Unix socket
+    in the user's runtime directory.
+    """
+    return os.path.join(platformdirs.user_runtime_dir("deepseek"), "pow.sock")
+
+
+def _send_message(sock: socket.socket, message: dict):
+    data = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data += chunk
+    return data
+
+
+def _recv_message(sock: socket.socket) -> dict:
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class _FairQueue:
+    """Queue that hands out jobs round-robin across callers,
+    so a caller with many pending challenges cannot starve the others."""
+
+    def __init__(self):
+        self._pending = {}  # caller -> list of jobs, in round-robin order
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, caller, job):
+        with self._cond:
+            self._pending.setdefault(caller, []).append(job)
+            self._cond.notify()
+
+    def get(self):
+        """Returns the next job, or None once the queue is closed."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            caller = next(iter(self._pending))
+            jobs = self._pending.pop(caller)
+            job = jobs.pop(0)
+            if jobs:  # move the caller to the back of the line
+                self._pending[caller] = jobs
+            return job
+
+    def discard(self, caller):
+        with self._cond:
+            self._pending.pop(caller, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def _worker_main(conn, wasm_path: str, cpu: int):
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    solver = POWSolver(wasm_path)
+    while (challenge := conn.recv()) is not None:
+        try:
+            conn.send((True, solver.solve_challenge(challenge)))
+        except Exception as e:
+            conn.send((False, repr(e)))
+
+
+class POWSolverDaemon:
+    """
+    Serves PoW solves to local processes over a Unix socket, keeping one warm
+    wasm instance per worker process, each pinned to its own core.
+    Messages are JSON objects prefixed with their 4-byte big-endian length:
+    requests are {"id", "challenge"}, replies are {"id", "result"} or {"id", "error"}.
+    If a worker process dies the daemon shuts down and closes every connection,
+    so clients fall back to solving in-process.
+    """
+
+    def __init__(self, socket_path: str = None, workers: int = None, wasm_path: str = None):
+        self.socket_path = socket_path or get_socket_path()
+        self.workers = workers or os.cpu_count() or 1
+        self.wasm_path = wasm_path or get_wasm_path()
+        self._jobs = _FairQueue()
+        self._processes = []
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+        self._server = None
+        self._close_lock = threading.Lock()
+        self._failure = None
+
+    def serve_forever(self):
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self._remove_stale_socket()
+        # workers are forked before the daemon starts any thread, which keeps startup cheap
+        mp = multiprocessing.get_context("fork")
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(
+            os, "sched_getaffinity") else []
+        workers = []
+        for i in range(self.workers):
+            parent_conn, child_conn = mp.Pipe()
+            cpu = cpus[i % len(cpus)] if cpus else None
+            process = mp.Process(
+                target=_worker_main, args=(child_conn, self.wasm_path, cpu), daemon=True)
+            process.start()
+            child_conn.close()  # so recv() sees EOF if the worker dies
+            self._processes.append(process)
+            workers.append(parent_conn)
+        for conn in workers:
+            threading.Thread(target=self._dispatch,
+                             args=(conn,), daemon=True).start()
+
+        server = self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen()
+        try:
+            while True:
+                client, _ = server.accept()
+                threading.Thread(target=self._handle_client,
+                                 args=(client,), daemon=True).start()
+        except OSError:
+            if self._server is not None:
+                raise
+        finally:
+            self.close()
+        if self._failure is not None:
+            raise RuntimeError(f"PoW daemon stopped: {self._failure}")
+
+    def _remove_stale_socket(self):
+        """Removes a socket left behind by a daemon that is no longer running."""
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise RuntimeError(f"{self.socket_path} exists and is not a socket")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+                return
+        raise RuntimeError(
+            f"A PoW daemon is already listening on {self.socket_path}")
+
+    def close(self):
+        with self._close_lock:
+            server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.shutdown(socket.SHUT_RDWR)  # wakes up a blocked accept()
+            except OSError:
+                pass
+            server.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+        self._jobs.close()
+        with self._clients_lock:
+            for client in self._clients:
+                try:
+                    client.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        for process in self._processes:
+            process.terminate()
+        self._processes = []
+
+    def _handle_client(self, client: socket.socket):
+        send_lock = threading.Lock()
+        with self._clients_lock:
+            self._clients.add(client)
+        try:
+            while True:
+                request = _recv_message(client)
+                if not isinstance(request, dict) or not isinstance(request.get("challenge"), dict):
+                    request_id = request.get("id") if isinstance(
+                        request, dict) else None
+                    with send_lock:
+                        _send_message(client, {
+                            "id": request_id, "error": "Invalid request: expected an object with a 'challenge' object"})
+                    continue
+                self._jobs.put(client, (client, send_lock, request))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._clients_lock:
+                self._clients.discard(client)
+            self._jobs.discard(client)
+            client.close()
+
+    def _dispatch(self, conn):
+        while (job := self._jobs.get()) is not None:
+            client, send_lock, request = job
+            try:
+                conn.send(request["challenge"])
+                ok, value = conn.recv()
+            except (EOFError, OSError) as e:
+                self._failure = f"worker process died ({e!r})"
+                self.close()
+                return
+            except Exception as e:
+                ok, value = False, repr(e)
+            reply = {"id": request.get("id")}
+            reply["result" if ok else "error"] = value
+            try:
+                with send_lock:
+                    _send_message(client, reply)
+            except OSError:
+                pass  # the caller went away
+
+
+class POWSolverClient:
+    """
+    Drop-in replacement for POWSolver that solves challenges through a
+    POWSolverDaemon. If the daemon cannot be reached or does not answer within
+    timeout seconds and fallback is enabled, challenges are solved by an
+    in-process POWSolver instead.
+    """
+
+    def __init__(self, socket_path: str = None, fallback: bool = True, wasm_path: str = None, timeout: float = 30.0):
+        self.socket_path = socket_path or get_socket_path()
+        self.fallback = fallback
+        self.wasm_path = wasm_path
+        self.timeout = timeout
+        self._sock = None
+        self._next_id = 0
+        self._local_solver = None
+        self._lock = threading.Lock()
+
+    def solve_challenge(self, challenge: dict):
+        with self._lock:
+            try:
+                return self._solve_remote(challenge)
+            except (OSError, ValueError):  # unreachable daemon or malformed reply
+                self.close()
+                if not self.fallback:
+                    raise
+            if self._local_solver is None:
+                self._local_solver = POWSolver(self.wasm_path)
+            return self._local_solver.solve_challenge(challenge)
+
+    def _solve_remote(self, challenge: dict):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+        self._next_id += 1
+        _send_message(self._sock, {"id": self._next_id, "challenge": challenge})
+        reply = _recv_message(self._sock)
+        if not isinstance(reply, dict) or reply.get("id") != self._next_id:
+            raise ConnectionError(f"Unexpected reply from PoW daemon: {reply}")
+        if "error" in reply:
+            raise RuntimeError(
+                f"PoW daemon failed to solve challenge: {reply['error']}")
+        if not isinstance(reply.get("result"), str):
+            raise ConnectionError(f"Malformed reply from PoW daemon: {reply}")
+        return reply["result"]
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve DeepSeek PoW solves to local processes over a Unix socket.")
+    parser.add_argument("--socket", help="socket path (default: %(default)s)",
+                        default=get_socket_path())
+    parser.add_argument("--workers", type=int,
+                        help="number of solver processes (default: one per core)")
+    parser.add_argument("--wasm-path", help="path to the solver wasm module")
+    args = parser.parse_args()
+    daemon = POWSolverDaemon(args.socket, args.workers, args.wasm_path)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import pytest
 import json
+import threading
+import time
 from unittest.mock import Mock, patch, call
 from src.deepseek_api.api import DeepSeekAPI
 
@@ -14,6 +16,17 @@ class TestDeepSeekAPI:
         assert api.session.headers["Content-Type"] == "application/json"
         assert api.pow_solver == mock_pow_solver
 
+    def test_timeout_is_passed_to_requests(self, mock_requests_session, mock_pow_solver):
+        """Test the configured timeout is used for HTTP requests."""
+        mock_response = Mock()
+        mock_response.json.return_value = {"data": {"biz_data": {"id": "chat123"}}}
+        mock_requests_session.post.return_value = mock_response
+
+        api = DeepSeekAPI("token", mock_pow_solver, timeout=30)
+        api.create_chat()
+
+        assert mock_requests_session.post.call_args.kwargs["timeout"] == 30
+
     def test_create_chat_success(self, mock_requests_session, mock_pow_solver):
         """Test create_chat returns chat data on success."""
         mock_response = Mock()
@@ -26,7 +39,7 @@ class TestDeepSeekAPI:
         result = api.create_chat()
 
         mock_requests_session.post.assert_called_once_with(
-            "https://chat.deepseek.com/api/v0/chat_session/create", "{}"
+            "https://chat.deepseek.com/api/v0/chat_session/create", "{}", timeout=None
         )
         assert result == {"id": "chat123", "title": "New Chat"}
 
@@ -40,7 +53,8 @@ class TestDeepSeekAPI:
         result = api.get_chat_info("test_chat_id")
 
         mock_requests_session.get.assert_called_once_with(
-            "https://chat.deepseek.com/api/v0/chat/history_messages?chat_session_id=test_chat_id"
+            "https://chat.deepseek.com/api/v0/chat/history_messages?chat_session_id=test_chat_id",
+            timeout=None
         )
         assert result == {"id": "test_chat_id", "title": "Test Chat"}
 
@@ -54,8 +68,8 @@ class TestDeepSeekAPI:
         with pytest.raises(Exception, match="Failed to get chat info: Some error"):
             api.get_chat_info("bad_id")
 
-    def test_set_pow_header(self, mock_requests_session, mock_pow_solver, sample_challenge):
-        """Test _set_pow_header sends challenge request and sets header."""
+    def test_pow_headers(self, mock_requests_session, mock_pow_solver, sample_challenge):
+        """Test _pow_headers sends challenge request and returns the header."""
         # Mock the challenge request response
         challenge_response = Mock()
         challenge_response.json.return_value = {
@@ -64,20 +78,23 @@ class TestDeepSeekAPI:
         mock_requests_session.post.return_value = challenge_response
 
         api = DeepSeekAPI("token", mock_pow_solver)
-        api._set_pow_header()
+        headers = api._pow_headers()
 
         # Verify POST to create_pow_challenge
         mock_requests_session.post.assert_called_once_with(
             "https://chat.deepseek.com/api/v0/chat/create_pow_challenge",
-            json.dumps({"target_path": "/api/v0/chat/completion"})
+            json.dumps({"target_path": "/api/v0/chat/completion"}),
+            timeout=None
         )
         # Verify solver was called with challenge
         mock_pow_solver.solve_challenge.assert_called_once_with(
             sample_challenge)
-        # Verify header was set
-        assert api.session.headers["x-ds-pow-response"] == mock_pow_solver.solve_challenge.return_value
+        # Verify header was returned without touching the shared session
+        assert headers == {
+            "x-ds-pow-response": mock_pow_solver.solve_challenge.return_value}
+        assert "x-ds-pow-response" not in api.session.headers
 
-    @patch('src.deepseek_api.api.DeepSeekAPI._set_pow_header')
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={"x-ds-pow-response": "pow"})
     def test_complete_non_streaming(self, mock_set_header, mock_requests_session, mock_pow_solver):
         """Test complete method in non-streaming mode."""
         # Mock the streaming response (simulate SSE lines)
@@ -94,7 +111,7 @@ class TestDeepSeekAPI:
         result = api.complete(
             "chat_id", "Hello", parent_message_id=123, search=True, thinking=False)
 
-        # Verify _set_pow_header called
+        # Verify _pow_headers called
         mock_set_header.assert_called_once()
         # Verify POST request
         expected_payload = {
@@ -108,12 +125,65 @@ class TestDeepSeekAPI:
         mock_requests_session.post.assert_called_once_with(
             "https://chat.deepseek.com/api/v0/chat/completion",
             json.dumps(expected_payload),
-            stream=True
+            headers={"x-ds-pow-response": "pow"},
+            stream=True,
+            timeout=None
         )
-        # Verify final result (should be dict with content)
-        assert result == {"content": "Hello world"}
+        # Verify final result (should carry the full response)
+        assert result["response"] == {"content": "Hello world"}
+        assert result["chat_session_id"] == "chat_id"
 
-    @patch('src.deepseek_api.api.DeepSeekAPI._set_pow_header')
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={"x-ds-pow-response": "pow"})
+    def test_complete_returns_message_ids(self, mock_set_header, mock_requests_session, mock_pow_solver):
+        """Test complete returns message ids, status and token usage from the stream."""
+        mock_response = Mock()
+        mock_response.iter_lines.return_value = [
+            b'event: ready',
+            b'data: {"request_message_id": 3, "response_message_id": 4}',
+            b'data: {"v": {"response": {"message_id": 4, "parent_id": 3, "content": "", "status": "WIP", "accumulated_token_usage": 0}}}',
+            b'data: {"v": "Hi", "p": "response/content", "o": "APPEND"}',
+            b'data: {"p": "response", "o": "BATCH", "v": [{"p": "accumulated_token_usage", "v": 12}, {"p": "status", "v": "FINISHED"}]}',
+            b'event: finish'
+        ]
+        mock_requests_session.post.return_value = mock_response
+
+        api = DeepSeekAPI("token", mock_pow_solver)
+        result = api.complete("chat_id", "Hello", parent_message_id=2)
+
+        assert result["request_message_id"] == 3
+        assert result["response_message_id"] == 4
+        assert result["status"] == "FINISHED"
+        assert result["token_usage"] == 12
+        assert result["response"]["content"] == "Hi"
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={"x-ds-pow-response": "pow"})
+    def test_complete_falls_back_to_response_ids(self, mock_set_header, mock_requests_session, mock_pow_solver):
+        """Test message ids are taken from the response when no ready event is sent."""
+        mock_response = Mock()
+        mock_response.iter_lines.return_value = [
+            b'data: {"v": {"response": {"message_id": 2, "parent_id": 1, "content": ""}}}',
+            b'event: finish'
+        ]
+        mock_requests_session.post.return_value = mock_response
+
+        api = DeepSeekAPI("token", mock_pow_solver)
+        result = api.complete("chat_id", "Hello")
+
+        assert result["request_message_id"] == 1
+        assert result["response_message_id"] == 2
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={"x-ds-pow-response": "pow"})
+    def test_complete_missing_response(self, mock_set_header, mock_requests_session, mock_pow_solver):
+        """Test complete raises when the stream never sends a response."""
+        mock_response = Mock()
+        mock_response.iter_lines.return_value = [b'event: finish']
+        mock_requests_session.post.return_value = mock_response
+
+        api = DeepSeekAPI("token", mock_pow_solver)
+        with pytest.raises(RuntimeError, match="No 'response' key"):
+            api.complete("chat_id", "Hello")
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={"x-ds-pow-response": "pow"})
     def test_complete_stream(self, mock_set_header, mock_requests_session, mock_pow_solver):
         """Test complete_stream generator yields correct chunks."""
         # Mock streaming response with both content and thinking chunks
@@ -139,10 +209,11 @@ class TestDeepSeekAPI:
             {"type": "thinking", "content": "thinking"},
             {"type": "content", "content": "Hello"},
             {"type": "content", "content": " world"},
-            {"type": "message", "content": {
-                "content": "Hello world", "thinking_content": "I am thinking"}}
         ]
-        assert chunks == expected_chunks
+        assert chunks[:-1] == expected_chunks
+        assert chunks[-1]["type"] == "message"
+        assert chunks[-1]["content"]["response"] == {
+            "content": "Hello world", "thinking_content": "I am thinking"}
 
     def test_handle_property_update_set(self):
         """Test _handle_property_update with SET operation."""
@@ -180,6 +251,16 @@ class TestDeepSeekAPI:
         assert result is False
         assert obj["a"]["b"] == "old"  # unchanged
 
+    def test_handle_property_update_batch(self):
+        """Test _handle_property_update applies each update of a BATCH operation."""
+        api = DeepSeekAPI("token", None)
+        obj = {"a": {"b": "old", "c": 0}}
+        update = {"p": "a", "o": "BATCH", "v": [
+            {"p": "b", "v": "new"}, {"p": "c", "v": 5}]}
+        result = api._handle_property_update(obj, update)
+        assert result is True
+        assert obj["a"] == {"b": "new", "c": 5}
+
     def test_handle_property_update_path_not_dict(self):
         """Test _handle_property_update when path intermediate is not dict."""
         api = DeepSeekAPI("token", None)
@@ -187,3 +268,137 @@ class TestDeepSeekAPI:
         update = {"p": "a/b", "v": "new", "o": "SET"}
         result = api._handle_property_update(obj, update)
         assert result is False
+
+
+def _slow_response(lines, release: threading.Event):
+    """A mock streaming response that blocks until released or closed."""
+    response = Mock()
+
+    def iter_lines():
+        release.wait()
+        yield from lines
+    response.iter_lines.side_effect = iter_lines
+    response.close.side_effect = release.set
+    return response
+
+
+class TestHedging:
+    """Tests for hedged completions."""
+
+    LINES = [
+        b'data: {"v": {"response": {"message_id": 2, "parent_id": 1, "content": ""}}}',
+        b'data: {"v": "Hi", "p": "response/content", "o": "APPEND"}',
+        b'event: finish'
+    ]
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={})
+    def test_hedge_wins_when_primary_is_slow(self, mock_headers, mock_requests_session, mock_pow_solver):
+        """Test a duplicate request in a fresh chat is used when the primary stalls."""
+        release = threading.Event()
+        slow = _slow_response([b'event: finish'], release)
+        fast = Mock()
+        fast.iter_lines.return_value = self.LINES
+        chat_response = Mock()
+        chat_response.json.return_value = {"data": {"biz_data": {"id": "fresh_chat"}}}
+
+        def post(url, *args, **kwargs):
+            if url.endswith("/chat_session/create"):
+                return chat_response
+            return slow if '"chat_id"' in args[0] else fast
+        mock_requests_session.post.side_effect = post
+
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=0.01, hedge_max_rate=1.0)
+        result = api.complete("chat_id", "Hello")
+
+        assert result["chat_session_id"] == "fresh_chat"
+        assert result["response"]["content"] == "Hi"
+        assert api.hedge_stats == {"requests": 1, "fired": 1, "won": 1}
+        slow.close.assert_called()
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={})
+    def test_no_hedge_when_primary_is_fast(self, mock_headers, mock_requests_session, mock_pow_solver):
+        """Test no duplicate is sent when the primary produces output in time."""
+        fast = Mock()
+        fast.iter_lines.return_value = self.LINES
+        mock_requests_session.post.return_value = fast
+
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=5, hedge_max_rate=1.0)
+        chunks = list(api.complete_stream("chat_id", "Hello"))
+
+        assert chunks[0] == {"type": "content", "content": "Hi"}
+        assert chunks[-1]["content"]["chat_session_id"] == "chat_id"
+        assert api.hedge_stats == {"requests": 1, "fired": 0, "won": 0}
+        assert mock_requests_session.post.call_count == 1
+
+    def test_hedge_rate_is_capped(self, mock_pow_solver):
+        """Test hedges are limited to hedge_max_rate after an initial burst of one."""
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=0, hedge_max_rate=0.25)
+        taken = []
+        for _ in range(8):
+            api.hedge_stats["requests"] += 1
+            taken.append(api._take_hedge())
+
+        # the first request may hedge, then hedges stay within 25% of requests
+        assert taken == [True, False, False, False,
+                         True, False, False, False]
+        assert api.hedge_stats["fired"] == 2
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={})
+    def test_follow_up_messages_are_not_hedged(self, mock_headers, mock_requests_session, mock_pow_solver):
+        """Test messages continuing a conversation bypass hedging."""
+        fast = Mock()
+        fast.iter_lines.return_value = self.LINES
+        mock_requests_session.post.return_value = fast
+
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=0, hedge_max_rate=1.0)
+        api.complete("chat_id", "Hello", parent_message_id=2)
+
+        assert api.hedge_stats["requests"] == 0
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={})
+    def test_error_is_raised_without_hedge(self, mock_headers, mock_requests_session, mock_pow_solver):
+        """Test an error from the only attempt is raised to the caller."""
+        mock_requests_session.post.side_effect = ConnectionError("boom")
+
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=5, hedge_max_rate=1.0)
+        with pytest.raises(ConnectionError, match="boom"):
+            api.complete("chat_id", "Hello")
+
+    @patch('src.deepseek_api.api.DeepSeekAPI._pow_headers', return_value={})
+    def test_failed_hedge_is_not_counted_as_won(self, mock_headers, mock_requests_session, mock_pow_solver):
+        """Test a hedge that fails after the primary failed is not counted as a win."""
+        release = threading.Event()
+        primary_failed = threading.Event()
+        primary = Mock()
+
+        def primary_lines():
+            release.wait()
+            primary_failed.set()
+            raise ConnectionError("primary failed")
+            yield
+        primary.iter_lines.side_effect = primary_lines
+        chat_response = Mock()
+        chat_response.json.return_value = {"data": {"biz_data": {"id": "fresh_chat"}}}
+
+        def post(url, *args, **kwargs):
+            if url.endswith("/chat_session/create"):
+                return chat_response
+            if '"chat_id"' in args[0]:
+                return primary
+            release.set()  # fail the primary first, then the hedge
+            primary_failed.wait()
+            time.sleep(0.05)
+            raise ConnectionError("hedge failed")
+        mock_requests_session.post.side_effect = post
+
+        api = DeepSeekAPI("token", mock_pow_solver,
+                          hedge_delay=0.01, hedge_max_rate=1.0)
+        with pytest.raises(ConnectionError):
+            api.complete("chat_id", "Hello")
+
+        assert api.hedge_stats == {"requests": 1, "fired": 1, "won": 0}
@@ -0,0 +1,224 @@
+import pytest
+import json
+import time
+from unittest.mock import Mock
+from src.deepseek_api.batch import _Checkpoint, run_batch
+
+
+def _write_input(path, prompts):
+    path.write_text("".join(json.dumps(
+        {"id": f"r{i}", "prompt": p}) + "\n" for i, p in enumerate(prompts)))
+
+
+def _make_api_factory(fail_on=(), delay=0):
+    """Returns a make_api callable whose APIs echo the prompt back."""
+    calls = []
+
+    def make_api():
+        api = Mock()
+        api.create_chat.return_value = {"id": "chat"}
+
+        def complete_stream(chat_id, prompt, search=False, thinking=False):
+            calls.append(prompt)
+            if prompt in fail_on:
+                raise RuntimeError("boom")
+            api.pow_solver.solve_challenge({})
+            for part in prompt.upper():
+                time.sleep(delay)
+                yield {"type": "content", "content": part}
+            yield {"type": "message", "content": {
+                "chat_session_id": chat_id,
+                "request_message_id": 1,
+                "response_message_id": 2,
+                "status": "FINISHED",
+                "token_usage": 5,
+                "response": {"content": prompt.upper()}
+            }}
+        api.complete_stream.side_effect = complete_stream
+        return api
+    return make_api, calls
+
+
+def _read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestCheckpoint:
+    """Tests for the _Checkpoint class."""
+
+    def test_watermark_advances_over_contiguous_lines(self):
+        """Test finished lines are folded into the watermark once contiguous."""
+        checkpoint = _Checkpoint()
+        checkpoint.mark_done(1)
+        assert checkpoint.watermark == 0 and checkpoint.done == {1}
+        checkpoint.mark_done(0)
+        assert checkpoint.watermark == 2 and checkpoint.done == set()
+        assert checkpoint.is_done(1)
+        assert not checkpoint.is_done(2)
+
+    def test_save_and_load(self, tmp_path):
+        """Test a saved checkpoint loads back with the same state."""
+        path = str(tmp_path / "ckpt")
+        checkpoint = _Checkpoint(3, [5, 7])
+        checkpoint.save(path, 120)
+        loaded = _Checkpoint.load(path)
+        assert loaded.watermark == 3
+        assert loaded.done == {5, 7}
+        assert loaded.output_offset == 120
+
+    def test_recover_reads_unsaved_results_and_truncates(self, tmp_path):
+        """Test results written after the last save count as done and a torn line is dropped."""
+        output = tmp_path / "out.jsonl"
+        saved = b'{"index": 0}\n'
+        output.write_bytes(saved + b'{"index": 2}\n{"index": 1')
+        checkpoint = _Checkpoint(1, output_offset=len(saved))
+        checkpoint.recover(str(output))
+        assert checkpoint.is_done(2)
+        assert not checkpoint.is_done(1)
+        assert output.read_bytes() == saved + b'{"index": 2}\n'
+
+    def test_recover_rejects_truncated_output(self, tmp_path):
+        """Test an output shorter than the checkpoint expects is an error, not padded."""
+        output = tmp_path / "out.jsonl"
+        output.write_bytes(b'{"index": 0}\n')
+        checkpoint = _Checkpoint(1, output_offset=500)
+        with pytest.raises(RuntimeError, match="shorter than the checkpoint"):
+            checkpoint.recover(str(output))
+        assert output.read_bytes() == b'{"index": 0}\n'
+
+    def test_recover_rejects_missing_output(self, tmp_path):
+        """Test a missing output with a non-empty checkpoint is an error."""
+        checkpoint = _Checkpoint(3, output_offset=100)
+        with pytest.raises(RuntimeError, match="is missing"):
+            checkpoint.recover(str(tmp_path / "out.jsonl"))
+
+
+class TestRunBatch:
+    """Tests for run_batch."""
+
+    def test_runs_all_records(self, tmp_path):
+        """Test every record is completed and written with ids and timings."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        _write_input(input_path, ["a", "b", "c"])
+        make_api, calls = _make_api_factory()
+
+        stats = run_batch(str(input_path), str(output_path), make_api,
+                          concurrency=2, progress_file=None)
+
+        results = sorted(_read_output(output_path), key=lambda r: r["index"])
+        assert [r["id"] for r in results] == ["r0", "r1", "r2"]
+        assert [r["content"] for r in results] == ["A", "B", "C"]
+        assert results[0]["response_message_id"] == 2
+        assert all(r["latency"] >= 0 and r["solve_time"] >= 0 for r in results)
+        assert stats.done == 3 and stats.solves == 3
+        assert _Checkpoint.load(f"{output_path}.checkpoint").watermark == 3
+
+    def test_errors_are_recorded(self, tmp_path):
+        """Test a failing record is written with its error."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        _write_input(input_path, ["a", "bad"])
+        make_api, _ = _make_api_factory(fail_on={"bad"})
+
+        stats = run_batch(str(input_path), str(output_path), make_api,
+                          concurrency=1, progress_file=None)
+
+        results = {r["id"]: r for r in _read_output(output_path)}
+        assert "boom" in results["r1"]["error"]
+        assert "error" not in results["r0"]
+        assert stats.errors == 1
+
+    def test_resume_skips_finished_records(self, tmp_path):
+        """Test a second run only processes records missing from the first."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        _write_input(input_path, ["a", "b", "c"])
+        # an interrupted run that finished line 1 and saved no checkpoint
+        output_path.write_text(json.dumps({"index": 1, "id": "r1"}) + "\n")
+        make_api, calls = _make_api_factory()
+
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=1, progress_file=None)
+
+        assert calls == ["a", "c"]
+        assert sorted(r["index"] for r in _read_output(output_path)) == [0, 1, 2]
+
+    def test_blank_lines_advance_the_checkpoint(self, tmp_path):
+        """Test blank input lines count as finished so the watermark is not held back."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        input_path.write_text('{"prompt": "a"}\n\n{"prompt": "b"}\n{"prompt": "c"}\n')
+        make_api, calls = _make_api_factory()
+
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=2, progress_file=None)
+
+        checkpoint = _Checkpoint.load(f"{output_path}.checkpoint")
+        assert checkpoint.watermark == 4
+        assert checkpoint.done == set()
+        assert sorted(calls) == ["a", "b", "c"]
+
+    def test_retry_errors(self, tmp_path):
+        """Test failed records are only run again when retry_errors is set."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        _write_input(input_path, ["a", "bad", "c"])
+        make_api, _ = _make_api_factory(fail_on={"bad"})
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=1, progress_file=None)
+
+        make_api, calls = _make_api_factory()
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=1, progress_file=None)
+        assert calls == []
+
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=1, retry_errors=True, progress_file=None)
+        assert calls == ["bad"]
+        assert _read_output(output_path)[-1]["content"] == "BAD"
+
+        run_batch(str(input_path), str(output_path), make_api,
+                  concurrency=1, retry_errors=True, progress_file=None)
+        assert calls == ["bad"]
+        assert _Checkpoint.load(f"{output_path}.checkpoint").watermark == 3
+
+    def test_slow_record_times_out(self, tmp_path):
+        """Test a record over the timeout is written as an error that can be retried."""
+        input_path = tmp_path / "in.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        _write_input(input_path, ["a", "slowprompt"])
+        make_api, _ = _make_api_factory(delay=0.02)
+
+        stats = run_batch(str(input_path), str(output_path), make_api,
+                          concurrency=2, timeout=0.1, progress_file=None)
+
+        results = {r["id"]: r for r in _read_output(output_path)}
+        assert "error" not in results["r0"]
+        assert "TimeoutError" in results["r1"]["error"]
+        assert stats.errors == 1
+
+    def test_timeout_is_set_on_api(self, tmp_path):
+        """Test the timeout is applied to the APIs' HTTP requests."""
+        input_path = tmp_path / "in.jsonl"
+        _write_input(input_path, ["a"])
+        make_api, _ = _make_api_factory()
+        apis = []
+
+        def tracking_make_api():
+            apis.append(make_api())
+            return apis[-1]
+
+        run_batch(str(input_path), str(tmp_path / "out.jsonl"), tracking_make_api,
+                  concurrency=1, timeout=7, progress_file=None)
+        assert apis[0].timeout == 7
+
+    def test_api_setup_failure_is_raised(self, tmp_path):
+        """Test a failure creating the API aborts the run."""
+        input_path = tmp_path / "in.jsonl"
+        _write_input(input_path, ["a"])
+        make_api = Mock(side_effect=RuntimeError("no wasm"))
+
+        with pytest.raises(RuntimeError, match="no wasm"):
+            run_batch(str(input_path), str(tmp_path / "out.jsonl"), make_api,
+                      concurrency=1, progress_file=None)
@@ -0,0 +1,274 @@
+import pytest
+import os
+import socket
+import threading
+import time
+from unittest.mock import Mock, patch
+from src.deepseek_api.pow_daemon import (
+    POWSolverClient, POWSolverDaemon, _FairQueue, _send_message, _recv_message)
+
+
+class TestProtocol:
+    """Tests for the length-prefixed message helpers."""
+
+    def test_roundtrip(self):
+        """Test a message sent on one end is received intact on the other."""
+        a, b = socket.socketpair()
+        with a, b:
+            _send_message(a, {"id": 1, "challenge": {"salt": "x" * 10000}})
+            assert _recv_message(b) == {
+                "id": 1, "challenge": {"salt": "x" * 10000}}
+
+    def test_recv_on_closed_connection(self):
+        """Test receiving from a closed connection raises ConnectionError."""
+        a, b = socket.socketpair()
+        a.close()
+        with b, pytest.raises(ConnectionError):
+            _recv_message(b)
+
+
+class TestFairQueue:
+    """Tests for the round-robin job queue."""
+
+    def test_round_robin_across_callers(self):
+        """Test jobs are handed out alternating between callers."""
+        jobs = _FairQueue()
+        for i in range(3):
+            jobs.put("busy", f"busy{i}")
+        jobs.put("quiet", "quiet0")
+        assert [jobs.get() for _ in range(4)] == [
+            "busy0", "quiet0", "busy1", "busy2"]
+
+    def test_discard_and_close(self):
+        """Test discarded callers lose their jobs and close unblocks get."""
+        jobs = _FairQueue()
+        jobs.put("gone", "job")
+        jobs.discard("gone")
+        jobs.close()
+        assert jobs.get() is None
+
+
+class TestPOWSolverDaemon:
+    """Tests for the daemon's request handling, without worker processes."""
+
+    def test_handle_client_and_dispatch(self, tmp_path, sample_challenge):
+        """Test requests from a client are solved by a worker and answered."""
+        daemon = POWSolverDaemon(
+            str(tmp_path / "pow.sock"), workers=1, wasm_path="/fake/path.wasm")
+        worker = Mock()
+        worker.recv.return_value = (True, "answer")
+        server_end, client_end = socket.socketpair()
+        threading.Thread(target=daemon._handle_client,
+                         args=(server_end,), daemon=True).start()
+        dispatcher = threading.Thread(
+            target=daemon._dispatch, args=(worker,), daemon=True)
+        dispatcher.start()
+
+        with client_end:
+            _send_message(client_end, {"id": 7, "challenge": sample_challenge})
+            assert _recv_message(client_end) == {"id": 7, "result": "answer"}
+        worker.send.assert_called_once_with(sample_challenge)
+
+        daemon._jobs.close()
+        dispatcher.join(timeout=1)
+        assert not dispatcher.is_alive()
+
+    def test_dispatch_reports_errors(self, tmp_path, sample_challenge):
+        """Test a failed solve is returned as an error reply."""
+        daemon = POWSolverDaemon(
+            str(tmp_path / "pow.sock"), workers=1, wasm_path="/fake/path.wasm")
+        worker = Mock()
+        worker.recv.return_value = (False, "AssertionError()")
+        server_end, client_end = socket.socketpair()
+        daemon._jobs.put(server_end, (server_end, threading.Lock(), {
+                         "id": 1, "challenge": sample_challenge}))
+        threading.Thread(target=daemon._dispatch,
+                         args=(worker,), daemon=True).start()
+
+        with client_end, server_end:
+            assert _recv_message(client_end) == {
+                "id": 1, "error": "AssertionError()"}
+
+
+    def test_invalid_request_gets_error_reply(self, tmp_path):
+        """Test malformed requests are answered with an error and not queued."""
+        daemon = POWSolverDaemon(
+            str(tmp_path / "pow.sock"), workers=1, wasm_path="/fake/path.wasm")
+        server_end, client_end = socket.socketpair()
+        threading.Thread(target=daemon._handle_client,
+                         args=(server_end,), daemon=True).start()
+
+        with client_end:
+            _send_message(client_end, {"id": 1})
+            assert _recv_message(client_end)["id"] == 1
+            _send_message(client_end, [])
+            reply = _recv_message(client_end)
+            assert reply["id"] is None and "Invalid request" in reply["error"]
+        assert daemon._jobs._pending == {}
+
+    def test_dispatch_survives_bad_job(self, tmp_path, sample_challenge):
+        """Test an unexpected error in one job is reported and the dispatcher keeps going."""
+        daemon = POWSolverDaemon(
+            str(tmp_path / "pow.sock"), workers=1, wasm_path="/fake/path.wasm")
+        worker = Mock()
+        worker.recv.return_value = (True, "answer")
+        server_end, client_end = socket.socketpair()
+        lock = threading.Lock()
+        daemon._jobs.put(server_end, (server_end, lock, {"id": 1}))
+        daemon._jobs.put(server_end, (server_end, lock, {
+                         "id": 2, "challenge": sample_challenge}))
+        threading.Thread(target=daemon._dispatch,
+                         args=(worker,), daemon=True).start()
+
+        with client_end, server_end:
+            assert "KeyError" in _recv_message(client_end)["error"]
+            assert _recv_message(client_end) == {"id": 2, "result": "answer"}
+
+    def test_stale_socket_is_removed(self, tmp_path):
+        """Test a socket file nobody listens on is removed before binding."""
+        path = str(tmp_path / "pow.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        daemon = POWSolverDaemon(path, workers=1, wasm_path="/fake/path.wasm")
+        daemon._remove_stale_socket()
+        assert not os.path.exists(path)
+
+    def test_refuses_to_replace_running_daemon(self, tmp_path):
+        """Test a second daemon does not take over the socket of a running one."""
+        path = str(tmp_path / "pow.sock")
+        daemon = POWSolverDaemon(path, workers=1, wasm_path="/fake/path.wasm")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as running:
+            running.bind(path)
+            running.listen()
+            with pytest.raises(RuntimeError, match="already listening"):
+                daemon._remove_stale_socket()
+        assert os.path.exists(path)
+
+    def test_refuses_to_remove_other_files(self, tmp_path):
+        """Test a regular file at the socket path is left alone."""
+        path = tmp_path / "pow.sock"
+        path.write_text("not a socket")
+        daemon = POWSolverDaemon(
+            str(path), workers=1, wasm_path="/fake/path.wasm")
+        with pytest.raises(RuntimeError, match="not a socket"):
+            daemon._remove_stale_socket()
+        assert path.exists()
+
+
+def _start_daemon(path):
+    daemon = POWSolverDaemon(path, workers=2, wasm_path="/fake/path.wasm")
+    errors = []
+
+    def serve():
+        try:
+            daemon.serve_forever()
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    return daemon, thread, errors
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")  # forking while pytest runs threads
+class TestPOWSolverDaemonEndToEnd:
+    """Tests running the daemon with real worker processes and a patched POWSolver."""
+
+    @patch('src.deepseek_api.pow_daemon.POWSolver')
+    def test_solve_and_close(self, mock_solver_class, tmp_path, sample_challenge):
+        """Test clients are served by worker processes and close stops the daemon."""
+        mock_solver_class.return_value.solve_challenge.return_value = "answer"
+        path = str(tmp_path / "pow.sock")
+        daemon, thread, errors = _start_daemon(path)
+
+        clients = [POWSolverClient(path, fallback=False, timeout=5)
+                   for _ in range(3)]
+        assert [c.solve_challenge(sample_challenge)
+                for c in clients] == ["answer"] * 3
+
+        daemon.close()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert errors == []
+        assert not os.path.exists(path)
+
+    @patch('src.deepseek_api.pow_daemon.POWSolver')
+    def test_dead_worker_stops_daemon(self, mock_solver_class, tmp_path, sample_challenge):
+        """Test a worker that dies makes the daemon stop so clients fall back."""
+        mock_solver_class.side_effect = RuntimeError("bad wasm")
+        path = str(tmp_path / "pow.sock")
+        daemon, thread, errors = _start_daemon(path)
+
+        client = POWSolverClient(path, fallback=False, timeout=5)
+        start = time.monotonic()
+        with pytest.raises(ConnectionError):
+            client.solve_challenge(sample_challenge)
+        assert time.monotonic() - start < 5
+
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert "worker process died" in str(errors[0])
+
+
+class TestPOWSolverClient:
+    """Tests for the POWSolverClient class."""
+
+    def _serve_once(self, path, reply):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+
+        def serve():
+            conn, _ = server.accept()
+            with conn:
+                request = _recv_message(conn)
+                _send_message(conn, {"id": request["id"], **reply})
+            server.close()
+        threading.Thread(target=serve, daemon=True).start()
+
+    def test_solve_through_daemon(self, tmp_path, sample_challenge):
+        """Test the client returns the daemon's answer."""
+        path = str(tmp_path / "pow.sock")
+        self._serve_once(path, {"result": "answer"})
+        client = POWSolverClient(path)
+        assert client.solve_challenge(sample_challenge) == "answer"
+        client.close()
+
+    def test_daemon_error_is_raised(self, tmp_path, sample_challenge):
+        """Test a solve error reported by the daemon is raised, not retried locally."""
+        path = str(tmp_path / "pow.sock")
+        self._serve_once(path, {"error": "AssertionError()"})
+        client = POWSolverClient(path)
+        with pytest.raises(RuntimeError, match="PoW daemon failed to solve challenge"):
+            client.solve_challenge(sample_challenge)
+
+    @patch('src.deepseek_api.pow_daemon.POWSolver')
+    def test_fallback_on_malformed_reply(self, mock_solver_class, tmp_path, sample_challenge):
+        """Test a malformed reply from the daemon falls back to solving in-process."""
+        mock_solver_class.return_value.solve_challenge.return_value = "local"
+        path = str(tmp_path / "pow.sock")
+        self._serve_once(path, {"result": None})
+        client = POWSolverClient(path)
+        assert client.solve_challenge(sample_challenge) == "local"
+
+    @patch('src.deepseek_api.pow_daemon.POWSolver')
+    def test_fallback_when_daemon_unavailable(self, mock_solver_class, tmp_path, sample_challenge):
+        """Test the client solves in-process when no daemon is listening."""
+        mock_solver_class.return_value.solve_challenge.return_value = "local"
+        client = POWSolverClient(
+            str(tmp_path / "missing.sock"), wasm_path="/fake/path.wasm")
+
+        assert client.solve_challenge(sample_challenge) == "local"
+        assert client.solve_challenge(sample_challenge) == "local"
+        mock_solver_class.assert_called_once_with("/fake/path.wasm")
+
+    def test_no_fallback_raises(self, tmp_path, sample_challenge):
+        """Test the connection error is raised when fallback is disabled."""
+        client = POWSolverClient(
+            str(tmp_path / "missing.sock"), fallback=False)
+        with pytest.raises(OSError):
+            client.solve_challenge(sample_challenge)